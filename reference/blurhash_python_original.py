@@ -1,5 +1,5 @@
 """
-Original blurhash-python source code from https://github.com/halcy/blurhash-python
+Modified from the original blurhash-python source code at https://github.com/halcy/blurhash-python
 
 Copyright (c) 2019 Lorenz Diener
 Licensed under the MIT License.
@@ -7,17 +7,44 @@ See https://github.com/halcy/blurhash-python/blob/master/LICENSE for full text.
 
 This file is included as a reference implementation for correctness validation.
 It is NOT part of the blurhash-rs library and is not distributed in any package.
+
+The hot loops are vectorized with NumPy when it is installed (and compiled with
+Numba when that is installed too); the pure-Python loops are kept as a fallback
+and all paths produce identical output. The exceptions are the opt-in fast modes:
+blurhash_encode(..., fast=True) runs the DCT in float32, which can change an AC
+digit on some inputs, and blurhash_decode(..., fast=True) uses an approximate
+sRGB curve (off by up to a few values per channel).
 """
+import array
+import concurrent.futures
+import functools
 import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 # Alphabet for base 83
 alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
-alphabet_values = dict(zip(alphabet, range(len(alphabet))))
+BASE83_LUT = bytearray(b"\xff" * 256)
+for _index, _char in enumerate(alphabet):
+    BASE83_LUT[ord(_char)] = _index
+del _index, _char
 
 def base83_decode(base83_str):
     value = 0
-    for base83_char in base83_str:
-        value = value * 83 + alphabet_values[base83_char]
+    for base83_byte in base83_str.encode("ascii"):
+        digit = BASE83_LUT[base83_byte]
+        if digit == 255:
+            raise ValueError("Invalid base83 character.")
+        value = value * 83 + digit
     return value
 
 def base83_encode(value, length):
@@ -29,6 +56,24 @@ def base83_encode(value, length):
         result += alphabet[int(digit)]
     return result
 
+if np is not None:
+    BASE83_ALPHABET_ARRAY = np.frombuffer(alphabet.encode("ascii"), dtype=np.uint8)
+    BASE83_LUT_ARRAY = np.frombuffer(bytes(BASE83_LUT), dtype=np.uint8)
+
+def _base83_decode_pairs(base83_str):
+    digits = BASE83_LUT_ARRAY[np.frombuffer(base83_str.encode("ascii"), dtype=np.uint8)]
+    if (digits == 255).any():
+        raise ValueError("Invalid base83 character.")
+    digits = digits.reshape(-1, 2).astype(np.int32)
+    return digits[:, 0] * 83 + digits[:, 1]
+
+def _base83_encode_pairs(values):
+    values = np.asarray(values, dtype=np.int32)
+    digits = np.empty((len(values), 2), dtype=np.uint8)
+    digits[:, 0] = BASE83_ALPHABET_ARRAY[values // 83]
+    digits[:, 1] = BASE83_ALPHABET_ARRAY[values % 83]
+    return digits.tobytes().decode("ascii")
+
 def srgb_to_linear(value):
     value = float(value) / 255.0
     if value <= 0.04045:
@@ -39,10 +84,94 @@ def sign_pow(value, exp):
     return math.copysign(math.pow(abs(value), exp), value)
 
 def linear_to_srgb(value):
-    value = max(0.0, min(1.0, value))
+    # Clamp with comparisons instead of max()/min() calls; NaN still maps to 1.0
+    value = value if value < 1.0 else 1.0
+    value = value if value > 0.0 else 0.0
     if value <= 0.0031308:
         return int(value * 12.92 * 255 + 0.5)
-    return int((1.055 * math.pow(value, 1 / 2.4) - 0.055) * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def _linear_to_srgb_threshold(target):
+    # Smallest linear value that linear_to_srgb() maps to at least `target`.
+    low, high = 0.0, 1.0
+    while True:
+        mid = (low + high) / 2.0
+        if mid == low or mid == high:
+            return high
+        if linear_to_srgb(mid) >= target:
+            high = mid
+        else:
+            low = mid
+
+# Lookup tables replacing the per-channel pow() calls in the hot paths
+SRGB_TO_LINEAR = [srgb_to_linear(value) for value in range(256)]
+LINEAR_TO_SRGB_THRESHOLDS = [_linear_to_srgb_threshold(target) for target in range(1, 256)]
+# Approximate linear -> sRGB (plain 1/2.2 gamma) for blurhash_decode(fast=True)
+LINEAR_TO_SRGB_FAST = [int(math.pow(index / 1023.0, 1 / 2.2) * 255 + 0.5) for index in range(1024)]
+if np is not None:
+    SRGB_TO_LINEAR = np.array(SRGB_TO_LINEAR)
+    LINEAR_TO_SRGB_THRESHOLDS = np.array(LINEAR_TO_SRGB_THRESHOLDS)
+    LINEAR_TO_SRGB_FAST = np.array(LINEAR_TO_SRGB_FAST, dtype=np.uint8)
+
+def _linear_to_srgb_fast(value):
+    return int(LINEAR_TO_SRGB_FAST[int(max(0.0, min(1.0, value)) * 1023 + 0.5)])
+
+if np is not None and numba is not None:
+    @numba.njit(parallel=True, nogil=True, fastmath=True, cache=True)
+    def _encode_kernel(image_linear, cos_x, cos_y, out):
+        height, width = image_linear.shape[0], image_linear.shape[1]
+        components_x = out.shape[1]
+        # Every (j, i) component is independent, so spread all of them
+        # over the worker threads rather than just the rows.
+        for index in numba.prange(out.shape[0] * components_x):
+            j = index // components_x
+            i = index % components_x
+            r = g = b = 0.0
+            for y in range(height):
+                for x in range(width):
+                    basis = cos_x[i, x] * cos_y[j, y]
+                    r += basis * image_linear[y, x, 0]
+                    g += basis * image_linear[y, x, 1]
+                    b += basis * image_linear[y, x, 2]
+            out[j, i, 0] = r
+            out[j, i, 1] = g
+            out[j, i, 2] = b
+
+    @numba.njit(parallel=True, nogil=True, fastmath=True, cache=True)
+    def _decode_kernel(colours_r, colours_g, colours_b, size_x, cos_x, cos_y, out):
+        size_y = colours_r.shape[0] // size_x
+        for y in numba.prange(out.shape[0]):
+            for x in range(out.shape[1]):
+                r = g = b = 0.0
+                for j in range(size_y):
+                    for i in range(size_x):
+                        basis = cos_x[x, i] * cos_y[y, j]
+                        r += colours_r[i + j * size_x] * basis
+                        g += colours_g[i + j * size_x] * basis
+                        b += colours_b[i + j * size_x] * basis
+                out[y, x, 0] = r
+                out[y, x, 1] = g
+                out[y, x, 2] = b
+
+    # Serial builds for callers that already run on their own threads: Numba's
+    # default workqueue threading layer cannot run parallel kernels concurrently.
+    # Not cached, as the on-disk cache would not tell them apart from the parallel builds.
+    _encode_kernel_serial = numba.njit(nogil=True, fastmath=True)(_encode_kernel.py_func)
+    _decode_kernel_serial = numba.njit(nogil=True, fastmath=True)(_decode_kernel.py_func)
+else:
+    _encode_kernel = _encode_kernel_serial = _decode_kernel = _decode_kernel_serial = None
+
+# Held while a parallel kernel runs; other threads use the serial builds meanwhile
+_parallel_kernel_lock = threading.Lock()
+
+def _run_kernel(parallel_kernel, serial_kernel, *args):
+    if _parallel_kernel_lock.acquire(blocking=False):
+        try:
+            parallel_kernel(*args)
+        finally:
+            _parallel_kernel_lock.release()
+    else:
+        serial_kernel(*args)
 
 def blurhash_components(blurhash):
     if len(blurhash) < 6:
@@ -52,7 +181,41 @@ def blurhash_components(blurhash):
     size_x = (size_info % 9) + 1
     return size_x, size_y
 
-def blurhash_decode(blurhash, width, height, punch=1.0, linear=False):
+def _blurhash_colours_numpy(dc_value, ac_str, real_max_value):
+    # Colours are stored as three contiguous channel rows (structure of arrays)
+    ac_values = _base83_decode_pairs(ac_str)
+    quant = np.stack([ac_values // (19 * 19), ac_values // 19 % 19, ac_values % 19])
+    value = (quant - 9.0) / 9.0
+    colours = np.empty((3, len(ac_values) + 1), dtype=np.float32)
+    # The red field of a valid hash can exceed 255, which falls outside the table
+    colours[:, 0] = [_srgb_to_linear_lookup(dc_value >> 16),
+                     _srgb_to_linear_lookup((dc_value >> 8) & 255),
+                     _srgb_to_linear_lookup(dc_value & 255)]
+    colours[:, 1:] = value * np.abs(value) * real_max_value
+    return colours
+
+def _blurhash_pixels_numpy(colours, size_x, size_y, width, height, linear, fast):
+    cos_x = np.cos(np.pi * np.outer(np.arange(width), np.arange(size_x)) / width)
+    if width == height and size_x == size_y:
+        cos_y = cos_x
+    else:
+        cos_y = np.cos(np.pi * np.outer(np.arange(height), np.arange(size_y)) / height)
+    if _decode_kernel is not None:
+        pixels = np.empty((height, width, 3))
+        _run_kernel(_decode_kernel, _decode_kernel_serial,
+                    colours[0], colours[1], colours[2], size_x, cos_x, cos_y, pixels)
+    else:
+        colours = colours.reshape(3, size_y, size_x)
+        pixels = np.einsum("yj,cji,xi->yxc", cos_y, colours, cos_x, optimize=True)
+    if linear == False and fast:
+        # NaN (from a NaN punch) maps to white, as in _linear_to_srgb_fast
+        pixels = np.clip(np.nan_to_num(pixels, nan=1.0), 0.0, 1.0)
+        pixels = LINEAR_TO_SRGB_FAST[(pixels * 1023 + 0.5).astype(np.intp)]
+    elif linear == False:
+        pixels = np.searchsorted(LINEAR_TO_SRGB_THRESHOLDS, pixels, side="right")
+    return pixels.tolist()
+
+def blurhash_decode(blurhash, width, height, punch=1.0, linear=False, fast=False):
     if len(blurhash) < 6:
         raise ValueError("BlurHash must be at least 6 characters long.")
     size_info = base83_decode(blurhash[0])
@@ -63,10 +226,13 @@ def blurhash_decode(blurhash, width, height, punch=1.0, linear=False):
     if len(blurhash) != 4 + 2 * size_x * size_y:
         raise ValueError("Invalid BlurHash length.")
     dc_value = base83_decode(blurhash[2:6])
+    if np is not None:
+        colours = _blurhash_colours_numpy(dc_value, blurhash[6:], real_max_value)
+        return _blurhash_pixels_numpy(colours, size_x, size_y, width, height, linear, fast)
     colours = [(
-        srgb_to_linear(dc_value >> 16),
-        srgb_to_linear((dc_value >> 8) & 255),
-        srgb_to_linear(dc_value & 255)
+        _srgb_to_linear_lookup(dc_value >> 16),
+        _srgb_to_linear_lookup((dc_value >> 8) & 255),
+        _srgb_to_linear_lookup(dc_value & 255)
     )]
     for component in range(1, size_x * size_y):
         ac_value = base83_decode(blurhash[4+component*2:4+(component+1)*2])
@@ -75,6 +241,7 @@ def blurhash_decode(blurhash, width, height, punch=1.0, linear=False):
             sign_pow((float(int(ac_value / 19) % 19) - 9.0) / 9.0, 2.0) * real_max_value,
             sign_pow((float(ac_value % 19) - 9.0) / 9.0, 2.0) * real_max_value
         ))
+    to_srgb = _linear_to_srgb_fast if fast else linear_to_srgb
     pixels = []
     for y in range(height):
         pixel_row = []
@@ -90,68 +257,156 @@ def blurhash_decode(blurhash, width, height, punch=1.0, linear=False):
                     pixel[2] += colour[2] * basis
             if linear == False:
                 pixel_row.append([
-                    linear_to_srgb(pixel[0]),
-                    linear_to_srgb(pixel[1]),
-                    linear_to_srgb(pixel[2]),
+                    to_srgb(pixel[0]),
+                    to_srgb(pixel[1]),
+                    to_srgb(pixel[2]),
                 ])
             else:
                 pixel_row.append(pixel)
         pixels.append(pixel_row)
     return pixels
 
-def blurhash_encode(image, components_x=4, components_y=4, linear=False):
-    if components_x < 1 or components_x > 9 or components_y < 1 or components_y > 9:
-        raise ValueError("x and y component counts must be between 1 and 9 inclusive.")
-    height = float(len(image))
-    width = float(len(image[0]))
+@functools.lru_cache(maxsize=256)
+def blurhash_decode_cached(blurhash, width, height, punch=1.0):
+    # Memoised decode for placeholders rendered repeatedly at the same size;
+    # the result is shared between callers, so it is returned as nested tuples.
+    pixels = blurhash_decode(blurhash, width, height, punch)
+    return tuple(tuple(tuple(pixel) for pixel in row) for row in pixels)
+
+def _srgb_to_linear_lookup(value):
+    # The table only covers integer pixel values; anything else uses the formula
+    if type(value) is int and 0 <= value <= 255:
+        return SRGB_TO_LINEAR[value]
+    return srgb_to_linear(value)
+
+def _srgb_image_to_linear_numpy(image):
+    image = np.asarray(image)
+    if np.issubdtype(image.dtype, np.integer) and image.size > 0 and \
+            image.min() >= 0 and image.max() <= 255:
+        return SRGB_TO_LINEAR[image]
+    value = image.astype(np.float64) / 255.0
+    with np.errstate(invalid="ignore"):
+        image_linear = np.where(value <= 0.04045, value / 12.92, ((value + 0.055) / 1.055) ** 2.4)
+    return image_linear
+
+def prepare_linear(image):
+    if np is not None:
+        return _srgb_image_to_linear_numpy(image)
     image_linear = []
-    if linear == False:
-        for y in range(int(height)):
-            image_linear_line = []
-            for x in range(int(width)):
-                image_linear_line.append([
-                    srgb_to_linear(image[y][x][0]),
-                    srgb_to_linear(image[y][x][1]),
-                    srgb_to_linear(image[y][x][2])
-                ])
-            image_linear.append(image_linear_line)
+    for y in range(len(image)):
+        image_linear_line = []
+        for x in range(len(image[0])):
+            image_linear_line.append([
+                _srgb_to_linear_lookup(image[y][x][0]),
+                _srgb_to_linear_lookup(image[y][x][1]),
+                _srgb_to_linear_lookup(image[y][x][2])
+            ])
+        image_linear.append(image_linear_line)
+    return image_linear
+
+def _blurhash_components_numpy(image_linear, components_x, components_y, parallel, fast):
+    # float32 halves the memory traffic of the DCT but can shift a quantised
+    # AC value by one step, so it is only used for fast=True
+    dtype = np.float32 if fast else np.float64
+    # Only the colour channels take part; an alpha channel is ignored like in the scalar loop
+    image_linear = np.asarray(image_linear, dtype=dtype)[..., :3]
+    height, width = image_linear.shape[0], image_linear.shape[1]
+    cos_x = np.cos(np.pi * np.arange(components_x)[:, None] * np.arange(width)[None, :] / width)
+    cos_y = np.cos(np.pi * np.arange(components_y)[:, None] * np.arange(height)[None, :] / height)
+    cos_x = cos_x.astype(dtype, copy=False)
+    cos_y = cos_y.astype(dtype, copy=False)
+    if _encode_kernel is not None:
+        components = np.empty((components_y, components_x, 3))
+        if parallel:
+            _run_kernel(_encode_kernel, _encode_kernel_serial, image_linear, cos_x, cos_y, components)
+        else:
+            _encode_kernel_serial(image_linear, cos_x, cos_y, components)
     else:
-        image_linear = image
+        components = np.einsum("jy,yxc,ix->jic", cos_y, image_linear, cos_x, optimize=True)
+        # The DC term decides the base colour, so sum it in the same row-major
+        # order as the scalar loop to round identically
+        components[0, 0] = np.cumsum(image_linear.reshape(-1, 3), axis=0)[-1]
+    norm_factors = np.full((components_y, components_x, 1), 2.0)
+    norm_factors[0, 0] = 1.0
+    components *= norm_factors
+    components /= width * height
+    return components.reshape(-1, 3)
+
+def _quantise_ac_numpy(ac_components, ac_component_norm_factor):
+    scaled = ac_components / ac_component_norm_factor
+    scaled = np.sign(scaled) * np.sqrt(np.abs(scaled)) * 9.0 + 9.5
+    quant = np.clip(np.floor(scaled), 0, 18).astype(np.int32)
+    return quant[:, 0] * 19 * 19 + quant[:, 1] * 19 + quant[:, 2]
+
+def _blurhash_components_python(image_linear, components_x, components_y):
+    height = float(len(image_linear))
+    width = float(len(image_linear[0]))
+    cos_x = [array.array("d", [math.cos(math.pi * float(i) * float(x) / width) for x in range(int(width))])
+             for i in range(components_x)]
+    cos_y = [array.array("d", [math.cos(math.pi * float(j) * float(y) / height) for y in range(int(height))])
+             for j in range(components_y)]
     components = []
-    max_ac_component = 0.0
     for j in range(components_y):
+        cos_y_j = cos_y[j]
         for i in range(components_x):
+            cos_x_i = cos_x[i]
             norm_factor = 1.0 if (i == 0 and j == 0) else 2.0
-            component = [0.0, 0.0, 0.0]
-            for y in range(int(height)):
-                for x in range(int(width)):
-                    basis = norm_factor * math.cos(math.pi * float(i) * float(x) / width) * \
-                                          math.cos(math.pi * float(j) * float(y) / height)
-                    component[0] += basis * image_linear[y][x][0]
-                    component[1] += basis * image_linear[y][x][1]
-                    component[2] += basis * image_linear[y][x][2]
-            component[0] /= (width * height)
-            component[1] /= (width * height)
-            component[2] /= (width * height)
-            components.append(component)
-            if not (i == 0 and j == 0):
-                max_ac_component = max(max_ac_component, abs(component[0]), abs(component[1]), abs(component[2]))
+            r = g = b = 0.0
+            for cos_y_jy, image_linear_line in zip(cos_y_j, image_linear):
+                for cos_x_ix, pixel in zip(cos_x_i, image_linear_line):
+                    basis = norm_factor * cos_x_ix * cos_y_jy
+                    r += basis * pixel[0]
+                    g += basis * pixel[1]
+                    b += basis * pixel[2]
+            components.append([r / (width * height), g / (width * height), b / (width * height)])
+    return components
+
+def _blurhash_encode(image, components_x, components_y, linear, fast, parallel):
+    if components_x < 1 or components_x > 9 or components_y < 1 or components_y > 9:
+        raise ValueError("x and y component counts must be between 1 and 9 inclusive.")
+    if linear == False:
+        image = prepare_linear(image)
+    if np is not None:
+        components = _blurhash_components_numpy(image, components_x, components_y, parallel, fast)
+        max_ac_component = float(np.abs(components[1:]).max(initial=0.0))
+    else:
+        components = _blurhash_components_python(image, components_x, components_y)
+        max_ac_component = 0.0
+        for component in components[1:]:
+            max_ac_component = max(max_ac_component, abs(component[0]), abs(component[1]), abs(component[2]))
     dc_value = (linear_to_srgb(components[0][0]) << 16) + \
                (linear_to_srgb(components[0][1]) << 8) + \
                linear_to_srgb(components[0][2])
     quant_max_ac_component = int(max(0, min(82, math.floor(max_ac_component * 166 - 0.5))))
     ac_component_norm_factor = float(quant_max_ac_component + 1) / 166.0
-    ac_values = []
-    for r, g, b in components[1:]:
-        ac_values.append(
-            int(max(0.0, min(18.0, math.floor(sign_pow(r / ac_component_norm_factor, 0.5) * 9.0 + 9.5)))) * 19 * 19 + \
-            int(max(0.0, min(18.0, math.floor(sign_pow(g / ac_component_norm_factor, 0.5) * 9.0 + 9.5)))) * 19 + \
-            int(max(0.0, min(18.0, math.floor(sign_pow(b / ac_component_norm_factor, 0.5) * 9.0 + 9.5))))
-        )
-    blurhash = ""
-    blurhash += base83_encode((components_x - 1) + (components_y - 1) * 9, 1)
-    blurhash += base83_encode(quant_max_ac_component, 1)
-    blurhash += base83_encode(dc_value, 4)
-    for ac_value in ac_values:
-        blurhash += base83_encode(ac_value, 2)
-    return blurhash
+    if np is not None:
+        ac_values = _quantise_ac_numpy(components[1:], ac_component_norm_factor)
+    else:
+        ac_values = []
+        for r, g, b in components[1:]:
+            ac_values.append(
+                int(max(0.0, min(18.0, math.floor(sign_pow(r / ac_component_norm_factor, 0.5) * 9.0 + 9.5)))) * 19 * 19 + \
+                int(max(0.0, min(18.0, math.floor(sign_pow(g / ac_component_norm_factor, 0.5) * 9.0 + 9.5)))) * 19 + \
+                int(max(0.0, min(18.0, math.floor(sign_pow(b / ac_component_norm_factor, 0.5) * 9.0 + 9.5))))
+            )
+    parts = [
+        base83_encode((components_x - 1) + (components_y - 1) * 9, 1),
+        base83_encode(quant_max_ac_component, 1),
+        base83_encode(dc_value, 4),
+    ]
+    if np is not None:
+        parts.append(_base83_encode_pairs(ac_values))
+    else:
+        for ac_value in ac_values:
+            parts.append(base83_encode(ac_value, 2))
+    return "".join(parts)
+
+def blurhash_encode(image, components_x=4, components_y=4, linear=False, fast=False):
+    return _blurhash_encode(image, components_x, components_y, linear, fast, True)
+
+def blurhash_encode_batch(images, components_x=4, components_y=4, linear=False, fast=False, max_workers=None):
+    # Images are spread over a thread pool; the NumPy and Numba kernels release the GIL
+    def encode(image):
+        return _blurhash_encode(image, components_x, components_y, linear, fast, False)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(encode, images))